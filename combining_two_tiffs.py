@@ -1,17 +1,23 @@
+import argparse
 import tifffile
 import numpy as np
 import cv2
-import matplotlib.pyplot as plt
+import rasterio
 import os
 
-def read_and_resize_image(image_path, resize=False, new_size=(1440, 600)):
+def read_and_resize_image(image_path, resize=False, new_size=(1440, 600), dst=None):
     """
     Reads a TIFF image and optionally resizes it.
 
+    Downscaling uses area interpolation, which avoids the aliasing of
+    bilinear interpolation; upscaling stays bilinear.
+
     Parameters:
         image_path (str): Path to the TIFF image.
         resize (bool): Whether to resize the image.
         new_size (tuple): Target size for resizing (width, height).
+        dst (np.ndarray, optional): Preallocated output buffer of shape (height, width) and the
+            image's dtype, reused across calls when resizing many images.
 
     Returns:
         np.ndarray: The processed image.
@@ -22,7 +28,9 @@ def read_and_resize_image(image_path, resize=False, new_size=(1440, 600)):
     image = tifffile.imread(image_path)
     if resize:
         print(f"Resizing image to {new_size}...")
-        image = cv2.resize(image, new_size)
+        downscale = new_size[0] <= image.shape[1] and new_size[1] <= image.shape[0]
+        interpolation = cv2.INTER_AREA if downscale else cv2.INTER_LINEAR
+        image = cv2.resize(image, new_size, dst=dst, interpolation=interpolation)
     return image
 
 def normalize_image(image):
@@ -53,15 +61,99 @@ def combine_images(img1, img2, alpha=0.5, beta=0.5, gamma=0):
     """
     return cv2.addWeighted(img1, alpha, img2, beta, gamma)
 
+def _weighted_normalized(image, weight):
+    """
+    Min-max scales an image to [0, 255 * weight] as float32 in one pass.
+
+    NaN pixels (e.g. ocean in GLDAS/GRACE rasters) are ignored for the
+    min/max and stay NaN. uint8 images are mapped through a 256-entry lookup
+    table instead of per-pixel arithmetic.
+
+    Parameters:
+        image (np.ndarray): Input image.
+        weight (float): Weight applied after scaling to [0, 255].
+
+    Returns:
+        np.ndarray: Scaled float32 image.
+    """
+    if image.dtype == np.uint8:
+        min_val, max_val = float(image.min()), float(image.max())
+    else:
+        min_val, max_val = float(np.nanmin(image)), float(np.nanmax(image))
+    scale = weight * 255.0 / (max_val - min_val) if max_val > min_val else 0.0
+    if image.dtype == np.uint8:
+        lut = (np.arange(256, dtype=np.float32) - min_val) * scale
+        return cv2.LUT(image, lut)
+    scaled = image.astype(np.float32)
+    scaled -= min_val
+    scaled *= scale
+    return scaled
+
+def fused_combine(img1, img2, alpha=0.5, beta=0.5, gamma=0):
+    """
+    Normalizes two images to [0, 255] and combines them using weighted addition in a single float32 pass.
+
+    The intermediate normalized uint8 images are not written, so results can
+    differ from ``combine_images(normalize_image(img1), normalize_image(img2))``
+    by one grey level. Pixels that are NaN in either image become 0.
+
+    Parameters:
+        img1 (np.ndarray): First image.
+        img2 (np.ndarray): Second image.
+        alpha (float): Weight of the first image.
+        beta (float): Weight of the second image.
+        gamma (float): Scalar added to each sum.
+
+    Returns:
+        np.ndarray: Combined uint8 image.
+    """
+    combined = _weighted_normalized(img1, alpha)
+    combined += _weighted_normalized(img2, beta)
+    combined += gamma + 0.5  # Round to nearest on the uint8 cast
+    np.nan_to_num(combined, copy=False, nan=0.0)
+    np.clip(combined, 0, 255, out=combined)
+    return combined.astype(np.uint8)
+
+def save_as_cog(image, output_path, reference_path=None):
+    """
+    Saves an image as a Cloud-Optimized GeoTIFF with DEFLATE compression, 512x512 tiles and overviews.
+
+    If a reference GeoTIFF is given, its CRS is copied and its transform is
+    rescaled to the image size, so resized outputs stay georeferenced.
+
+    Parameters:
+        image (np.ndarray): 2D image, or 3D image with shape (height, width, bands).
+        output_path (str): Path to save the COG.
+        reference_path (str, optional): GeoTIFF to take the CRS and transform from.
+    """
+    bands = image[np.newaxis] if image.ndim == 2 else np.moveaxis(image, -1, 0)
+    count, height, width = bands.shape
+
+    crs, transform = None, None
+    if reference_path is not None:
+        with rasterio.open(reference_path) as ref:
+            crs = ref.crs
+            transform = ref.transform * ref.transform.scale(ref.width / width, ref.height / height)
+
+    with rasterio.open(
+        output_path, 'w', driver='COG', height=height, width=width, count=count, dtype=bands.dtype,
+        crs=crs, transform=transform, compress='DEFLATE', blocksize=512, overview_resampling='average',
+    ) as dst:
+        dst.write(bands)
+
 def visualize_images(img1, img2, combined_img):
     """
     Visualizes the input and combined images using matplotlib.
 
+    matplotlib is imported here so headless batch runs do not pay for it.
+
     Parameters:
         img1 (np.ndarray): First image.
         img2 (np.ndarray): Second image.
         combined_img (np.ndarray): Combined image.
     """
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(15, 5))
     plt.subplot(1, 3, 1)
     plt.imshow(img1, cmap='gray')
@@ -82,9 +174,16 @@ def visualize_images(img1, img2, combined_img):
 
 # Main script
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Combine two TIFF images using weighted addition.")
+    parser.add_argument("--image1", default="/path/to/image1.tif", help="Path to the first TIFF image.")
+    parser.add_argument("--image2", default="/path/to/image2.tif", help="Path to the second TIFF image.")
+    parser.add_argument("--output", default="combined_image.tif", help="Path to save the combined image.")
+    parser.add_argument("--show", action="store_true", help="Display the input and combined images.")
+    args = parser.parse_args()
+
     # File paths
-    tif1_img_path = "/path/to/image1.tif"
-    tif2_img_path = "/path/to/image2.tif"
+    tif1_img_path = args.image1
+    tif2_img_path = args.image2
 
     try:
         # Read and resize images
@@ -98,20 +197,17 @@ if __name__ == "__main__":
         if tif1_img.shape != tif2_img.shape:
             raise ValueError("Error: Images are not the same size!")
 
-        # Normalize images
-        tif1_img = normalize_image(tif1_img)
-        tif2_img = normalize_image(tif2_img)
-
-        # Combine images
-        combined_img = combine_images(tif1_img, tif2_img)
+        # Normalize and combine images in one pass
+        combined_img = fused_combine(tif1_img, tif2_img)
 
         # Save the combined image
-        combined_img_path = "combined_image.tif"
+        combined_img_path = args.output
         print(f"Saving combined image to {combined_img_path}...")
-        cv2.imwrite(combined_img_path, combined_img)
+        save_as_cog(combined_img, combined_img_path, reference_path=tif1_img_path)
 
         # Visualize images
-        visualize_images(tif1_img, tif2_img, combined_img)
+        if args.show:
+            visualize_images(tif1_img, tif2_img, combined_img)
 
         print("Processing complete.")
     except Exception as e:
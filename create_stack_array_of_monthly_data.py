@@ -1,37 +1,142 @@
 import rasterio
 import numpy as np
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.errors import WindowError
+from rasterio.windows import Window, from_bounds
 
-def read_tiff_to_array(tiff_path):
+# Thread pool size for TIFF reads (GDAL releases the GIL while decoding)
+MAX_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+def aoi_window(aoi, transform):
+    """
+    Convert a bounding box to the whole-pixel window it covers.
+    
+    Parameters:
+        aoi (tuple): Bounding box (left, bottom, right, top) in the raster's CRS.
+        transform (Affine): Transform of the raster.
+    
+    Returns:
+        rasterio.windows.Window: Window with integer offsets and lengths.
     """
-    Read the first band of a TIFF file into a NumPy array.
+    return from_bounds(*aoi, transform=transform).round_offsets().round_lengths()
+
+def _read_window_into(src, window, out):
+    """
+    Read a pixel window of the first band into ``out``, leaving parts outside the raster as NaN.
+    
+    The window is clipped to the raster and only the overlapping part is
+    read into the matching sub-slice of ``out``, so nothing is resampled.
+    
+    Parameters:
+        src (rasterio.DatasetReader): Open dataset.
+        window (rasterio.windows.Window): Window with integer offsets and lengths, possibly past the raster edge.
+        out (np.ndarray): 2D float array with the window's shape.
+    
+    Raises:
+        ValueError: If ``out`` does not have the window's shape.
+    """
+    shape = (int(window.height), int(window.width))
+    if out.shape != shape:
+        raise ValueError(f"Window shape {shape} of {src.name} does not match the destination shape {out.shape}")
+    out[...] = np.nan
+    try:
+        inside = window.intersection(Window(0, 0, src.width, src.height))
+    except WindowError:
+        return  # The window lies entirely outside the raster
+    row = int(inside.row_off - window.row_off)
+    col = int(inside.col_off - window.col_off)
+    src.read(1, window=inside, out=out[row:row + int(inside.height), col:col + int(inside.width)])
+
+def read_tiff_to_array(tiff_path, out=None, aoi=None, window=None):
+    """
+    Read the first band of a TIFF file into a float32 NumPy array.
+
+    Nodata pixels are set to NaN (np.float32('nan')). Internally tiled files
+    are read block by block straight into the destination array. If an area
+    of interest or a pixel window is given, only that window is read; parts
+    of it outside the raster are NaN.
     
     Parameters:
         tiff_path (str): Path to the TIFF file.
+        out (np.ndarray, optional): Preallocated 2D float array (e.g. a slot of the stack) to read into.
+        aoi (tuple, optional): Bounding box (left, bottom, right, top) in the raster's CRS to read.
+        window (rasterio.windows.Window, optional): Pixel window to read instead of the area of interest.
     
     Returns:
-        np.ndarray: 2D array of the TIFF file's first band.
+        np.ndarray: 2D array of the TIFF file's first band (``out`` if given, float32 otherwise).
+    
+    Raises:
+        ValueError: If ``out`` does not match the shape of the raster or of the window read.
     """
     print(f"Attempting to read file: {tiff_path}")
-    with rasterio.open(tiff_path) as src:
-        return src.read(1)
+    with rasterio.open(tiff_path, sharing=False) as src:
+        if window is None and aoi is not None:
+            window = aoi_window(aoi, src.transform)
+        if out is None:
+            shape = src.shape if window is None else (int(window.height), int(window.width))
+            out = np.empty(shape, dtype=np.float32)
+        _, block_cols = src.block_shapes[0]
+        if window is not None:
+            # Area of interest or tile: read only the pixels inside it
+            _read_window_into(src, window, out)
+        elif out.shape != src.shape:
+            raise ValueError(f"Raster shape {src.shape} of {tiff_path} does not match the destination shape {out.shape}")
+        elif block_cols < src.width:
+            # Tiled TIFF: read each internal block into its sub-slice
+            for _, window in src.block_windows(1):
+                src.read(1, window=window, out=out[window.toslices()])
+        else:
+            src.read(1, out=out)
+        if src.nodata is not None:
+            out[out == out.dtype.type(src.nodata)] = np.nan
+        return out
+
+def _read_one(task):
+    """
+    Read one file into its stack slot in a worker thread.
+
+    Parameters:
+        task (tuple): (file_path, out, aoi) triple, where ``out`` is the 2D slot of the stack
+            and ``aoi`` the optional bounding box to read.
+    """
+    file_path, out, aoi = task
+    try:
+        with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS', GDAL_CACHEMAX=512):
+            read_tiff_to_array(file_path, out=out, aoi=aoi)
+    except rasterio.errors.RasterioIOError as e:
+        print(f"Error reading file {file_path}: {e}")
+        out[...] = np.nan
 
-def get_shape_of_first_tiff(tiff_files, tiff_directory):
+def scan_tiff_directory(tiff_directory):
     """
-    Determine the shape of arrays from the first available TIFF file.
+    Map the TIFF filenames in a directory to their paths with a single directory scan.
     
     Parameters:
-        tiff_files (list): List of TIFF filenames.
         tiff_directory (str): Directory containing TIFF files.
     
     Returns:
-        tuple: Shape of the first valid TIFF array.
+        dict: Mapping of TIFF filename to file path.
     """
-    for file in tiff_files:
-        file_path = os.path.join(tiff_directory, file)
+    with os.scandir(tiff_directory) as entries:
+        return {entry.name: entry.path for entry in entries if entry.name.endswith('.tif')}
+
+def probe_first_tiff(tiff_paths):
+    """
+    Read the grid metadata of the first available TIFF file without reading its pixels.
+    
+    Parameters:
+        tiff_paths (dict): Mapping of TIFF filename to file path.
+    
+    Returns:
+        tuple: (shape, dtype, transform, crs) of the first valid TIFF file's first band.
+    """
+    for file in sorted(tiff_paths):
+        file_path = tiff_paths[file]
         try:
             with rasterio.open(file_path) as src:
-                return src.read(1).shape
+                return src.shape, np.dtype(src.dtypes[0]), src.transform, src.crs
         except rasterio.errors.RasterioIOError as e:
             print(f"Error reading file {file_path}: {e}")
             continue
@@ -54,35 +159,202 @@ def generate_expected_filenames(start_year, end_year):
         for month in range(1, 13)
     ]
 
-def stack_tiff_files_with_nans(expected_files, tiff_files, array_shape, tiff_directory):
+def stack_tiff_files_with_nans(expected_files, tiff_paths, template, aoi=None):
     """
     Stack TIFF files into a 3D array with NaNs for missing months.
+
+    Available files are read concurrently in a thread pool.
     
     Parameters:
         expected_files (list): List of expected filenames.
-        tiff_files (list): List of actual filenames.
-        array_shape (tuple): Shape of each 2D array.
-        tiff_directory (str): Directory containing TIFF files.
+        tiff_paths (dict): Mapping of actual filenames to file paths.
+        template (tuple): (shape, dtype, transform, crs) of the first TIFF, from probe_first_tiff.
+        aoi (tuple, optional): Bounding box (left, bottom, right, top) in the TIFFs' CRS; only this
+            area is read and stacked.
     
     Returns:
-        np.ndarray: 3D array with TIFF data and NaNs for missing months.
+        np.ndarray: 3D float array (float32 unless the TIFFs need float64) with shape (time, rows, cols)
+        with TIFF data and NaNs for missing months.
     """
-    # Create an empty 3D array filled with NaNs
-    stacked_array = np.full((*array_shape, len(expected_files)), np.nan)
-    
-    # Create a set of actual filenames for quick lookup
-    actual_files_set = set(tiff_files)
+    array_shape, dtype, transform, _ = template
+    if aoi is not None:
+        window = aoi_window(aoi, transform)
+        array_shape = (int(window.height), int(window.width))
+
+    # Create an empty time-first 3D array filled with NaNs, using the smallest float dtype that holds the data
+    stacked_array = np.full((len(expected_files), *array_shape), np.nan, dtype=np.result_type(dtype, np.float32))
     
+    tasks = []
     for index, filename in enumerate(expected_files):
-        file_path = os.path.join(tiff_directory, filename)
-        if filename in actual_files_set:
-            try:
-                array = read_tiff_to_array(file_path)
-                stacked_array[..., index] = array  # Add the data to the stack
-            except rasterio.errors.RasterioIOError as e:
-                print(f"Error reading file {file_path}: {e}")
-        else:
+        file_path = tiff_paths.get(filename)
+        if file_path is None:
             print(f"Missing file: {filename}")
+            continue
+        tasks.append((file_path, stacked_array[index], aoi))
+    
+    # Read the available files concurrently, each directly into its slot of the stack
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(_read_one, tasks))
+    
+    return stacked_array
+
+def _read_lazy_tile(file_path, window, dtype):
+    """
+    Read one spatial tile of one file into a new (1, rows, cols) chunk (run by dask).
+    
+    Parameters:
+        file_path (str): Path to the TIFF file.
+        window (rasterio.windows.Window): Pixel window of the tile in the raster.
+        dtype (np.dtype): Dtype of the stack.
+    
+    Returns:
+        np.ndarray: 3D array with the tile's data, or NaNs if it could not be read.
+    """
+    out = np.empty((1, int(window.height), int(window.width)), dtype=dtype)
+    try:
+        with rasterio.Env(GDAL_NUM_THREADS='ALL_CPUS', GDAL_CACHEMAX=512):
+            read_tiff_to_array(file_path, out=out[0], window=window)
+    except rasterio.errors.RasterioIOError as e:
+        print(f"Error reading file {file_path}: {e}")
+        out[...] = np.nan
+    return out
+
+def stack_tiff_files_lazy(expected_files, tiff_paths, template, aoi=None, tile_size=512):
+    """
+    Stack TIFF files into a lazy dask array with NaNs for missing months.
+    
+    Every (file, spatial tile) pair is a separate delayed windowed read,
+    so each chunk starts as (1, tile_size, tile_size) and computing a tile
+    only reads that tile from each file. Use this for cubes that do not fit
+    in memory; requires dask.
+    
+    Parameters:
+        expected_files (list): List of expected filenames.
+        tiff_paths (dict): Mapping of actual filenames to file paths.
+        template (tuple): (shape, dtype, transform, crs) of the first TIFF, from probe_first_tiff.
+        aoi (tuple, optional): Bounding box (left, bottom, right, top) in the TIFFs' CRS; only this
+            area is read and stacked.
+        tile_size (int): Rows and columns of each spatial chunk.
+    
+    Returns:
+        dask.array.Array: Lazy 3D array with shape (time, rows, cols).
+    """
+    import dask
+    import dask.array as da
+
+    (rows, cols), dtype, transform, _ = template
+    window = aoi_window(aoi, transform) if aoi is not None else Window(0, 0, cols, rows)
+    rows, cols = int(window.height), int(window.width)
+    stack_dtype = np.result_type(dtype, np.float32)
+    
+    # Pixel windows of the spatial tiles, row by row
+    tile_windows = [
+        [
+            Window(window.col_off + col, window.row_off + row,
+                   min(tile_size, cols - col), min(tile_size, rows - row))
+            for col in range(0, cols, tile_size)
+        ]
+        for row in range(0, rows, tile_size)
+    ]
+    
+    slices = []
+    for filename in expected_files:
+        file_path = tiff_paths.get(filename)
+        if file_path is None:
+            print(f"Missing file: {filename}")
+            slices.append(da.full((1, rows, cols), np.nan, dtype=stack_dtype, chunks=(1, tile_size, tile_size)))
+            continue
+        slices.append(da.block([
+            [
+                da.from_delayed(
+                    dask.delayed(_read_lazy_tile)(file_path, tile, stack_dtype),
+                    shape=(1, int(tile.height), int(tile.width)), dtype=stack_dtype,
+                )
+                for tile in tile_row
+            ]
+            for tile_row in tile_windows
+        ]))
+    
+    return da.concatenate(slices, axis=0)
+
+def reshape_stack_by_month(stacked_array):
+    """
+    View a monthly stack as (years, 12, rows, cols) without copying it.
+    
+    ``reshape_stack_by_month(stack)[:, month - 1]`` is the (years, rows, cols)
+    array of one calendar month.
+    
+    Parameters:
+        stacked_array (np.ndarray): 3D array with shape (time, rows, cols) starting in January.
+    
+    Returns:
+        np.ndarray: 4D view with shape (years, 12, rows, cols).
+    """
+    return stacked_array.reshape(-1, 12, *stacked_array.shape[1:])
+
+def _stack_cache_metadata(expected_files, tiff_paths, aoi):
+    """
+    Describe the inputs of a stack so a cached copy can be validated.
+    
+    Parameters:
+        expected_files (list): List of expected filenames.
+        tiff_paths (dict): Mapping of actual filenames to file paths.
+        aoi (tuple or None): Bounding box the stack was read for.
+    
+    Returns:
+        dict: Expected filenames, area of interest, missing filenames and modification times of the available files.
+    """
+    return {
+        "expected_files": list(expected_files),
+        "aoi": list(aoi) if aoi is not None else None,
+        "missing": [filename for filename in expected_files if filename not in tiff_paths],
+        "mtimes": {
+            filename: os.stat(tiff_paths[filename]).st_mtime_ns
+            for filename in expected_files
+            if filename in tiff_paths
+        },
+    }
+
+def load_or_stack_tiff_files(expected_files, tiff_paths, cache_path, aoi=None):
+    """
+    Load the stacked 3D array from a .npy cache, or build it and write the cache.
+    
+    The cache is a .npy file plus a JSON sidecar recording the shape, dtype
+    and input files. It is reused only while the expected files, area of
+    interest, missing months and TIFF modification times are unchanged, and is then
+    memory-mapped read-only instead of decoding the TIFFs again.
+    
+    Parameters:
+        expected_files (list): List of expected filenames.
+        tiff_paths (dict): Mapping of actual filenames to file paths.
+        cache_path (str): Path of the .npy cache file (".npy" is appended if missing, as np.save does).
+        aoi (tuple, optional): Bounding box (left, bottom, right, top) in the TIFFs' CRS to stack.
+    
+    Returns:
+        np.ndarray: 3D array with shape (time, rows, cols) with TIFF data and NaNs for missing months
+        (a read-only memory map when loaded from the cache).
+    """
+    if not cache_path.endswith(".npy"):
+        cache_path += ".npy"
+    sidecar_path = os.path.splitext(cache_path)[0] + ".json"
+    metadata = _stack_cache_metadata(expected_files, tiff_paths, aoi)
+    
+    if os.path.exists(cache_path) and os.path.exists(sidecar_path):
+        with open(sidecar_path) as f:
+            cached = json.load(f)
+        if all(cached.get(key) == value for key, value in metadata.items()):
+            print(f"Loading cached stack from {cache_path}")
+            return np.load(cache_path, mmap_mode='r')
+    
+    # Drop a stale sidecar first so an interrupted write is never treated as valid
+    if os.path.exists(sidecar_path):
+        os.remove(sidecar_path)
+    
+    stacked_array = stack_tiff_files_with_nans(expected_files, tiff_paths, probe_first_tiff(tiff_paths), aoi=aoi)
+    np.save(cache_path, stacked_array)
+    with open(sidecar_path, 'w') as f:
+        json.dump({"shape": stacked_array.shape, "dtype": stacked_array.dtype.str, **metadata}, f)
+    print(f"Stack cached to {cache_path}")
     
     return stacked_array
 
@@ -91,18 +363,16 @@ if __name__ == "__main__":
     tiff_directory = '/home/prahlada/GWSA_clipped_Output'
     start_year = 2003
     end_year = 2021
+    cache_path = 'stack.npy'
 
-    # List of actual TIFF files in the directory
-    tiff_files = sorted([file for file in os.listdir(tiff_directory) if file.endswith('.tif')])
+    # Map of actual TIFF files in the directory to their paths
+    tiff_paths = scan_tiff_directory(tiff_directory)
 
     # Generate the list of expected filenames
     expected_files = generate_expected_filenames(start_year, end_year)
 
-    # Determine the shape of each 2D array
-    array_shape = get_shape_of_first_tiff(tiff_files, tiff_directory)
-
-    # Stack the TIFF files into a 3D array with NaNs for missing months
-    tiff_3d_array_with_nans = stack_tiff_files_with_nans(expected_files, tiff_files, array_shape, tiff_directory)
+    # Stack the TIFF files into a 3D array with NaNs for missing months (cached after the first run)
+    tiff_3d_array_with_nans = load_or_stack_tiff_files(expected_files, tiff_paths, cache_path)
 
     # Print the shape of the resulting 3D array
     print(f"3D array shape: {tiff_3d_array_with_nans.shape}")
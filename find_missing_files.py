@@ -11,12 +11,11 @@ def generate_expected_filenames(start_year, end_year):
     Returns:
         list: A list of expected TIFF filenames.
     """
-    expected_files = []
-    for year in range(start_year, end_year + 1):
-        for month in range(1, 13):
-            filename = f"clipped_final_img_{year}_{month:02d}.tif"
-            expected_files.append(filename)
-    return expected_files
+    return [
+        f"clipped_final_img_{year}_{month:02d}.tif"
+        for year in range(start_year, end_year + 1)
+        for month in range(1, 13)
+    ]
 
 def get_actual_filenames(directory):
     """
@@ -1,6 +1,10 @@
-import rasterio
-import numpy as np
-import os
+from create_stack_array_of_monthly_data import (
+    generate_expected_filenames,
+    probe_first_tiff,
+    reshape_stack_by_month,
+    scan_tiff_directory,
+    stack_tiff_files_with_nans,
+)
 
 # Example TIFF path (to guide new users)
 DUMMY_DIRECTORY = "data/example_tiffs/"  
@@ -9,94 +13,55 @@ DUMMY_MISSING_FILES = [
     "clipped_final_img_2018_01.tif"
 ]
 
-def read_tiff_to_array(tiff_path):
-    """
-    Reads a single TIFF file and returns its first band as a NumPy array.
-
-    Parameters:
-        tiff_path (str): Path to the TIFF file.
-
-    Returns:
-        np.ndarray: 2D NumPy array from the TIFF file.
-    """
-    with rasterio.open(tiff_path) as src:
-        return src.read(1)  # Read the first band
-
-def get_shape_of_first_tiff(tiff_files, tiff_directory):
-    """
-    Determines the shape of the first valid TIFF file in the directory.
-
-    Parameters:
-        tiff_files (list): List of available TIFF filenames.
-        tiff_directory (str): Directory containing TIFF files.
-
-    Returns:
-        tuple: Shape of the first valid TIFF file as (rows, cols).
-    
-    Raises:
-        FileNotFoundError: If no valid TIFF files are found.
-    """
-    for file in tiff_files:
-        file_path = os.path.join(tiff_directory, file)
-        try:
-            with rasterio.open(file_path) as src:
-                return src.read(1).shape  # Return shape of the first band
-        except rasterio.errors.RasterioIOError as e:
-            print(f"Error reading file {file_path}: {e}")
-    raise FileNotFoundError("No valid TIFF files found to determine array shape.")
-
-def create_monthly_3d_arrays(tiff_files, missing_files, start_year, end_year, tiff_directory):
+def create_monthly_3d_arrays(tiff_paths, missing_files, start_year, end_year, stacked_array=None, aoi=None):
     """
     Creates 3D NumPy arrays for each month across a range of years, with NaNs for missing data.
 
+    The TIFFs are stacked once into a (time, rows, cols) cube and each month's
+    array is a zero-copy view of it, so no file is read twice.
+
     Parameters:
-        tiff_files (list): List of available TIFF filenames.
+        tiff_paths (dict): Mapping of available TIFF filenames to file paths.
         missing_files (list): List of missing TIFF filenames.
         start_year (int): Start year for the data (e.g., 2003).
         end_year (int): End year for the data (e.g., 2021).
-        tiff_directory (str): Directory containing the TIFF files.
+        stacked_array (np.ndarray, optional): Already stacked (time, rows, cols) array for the same
+            years (e.g. the cached stack), used instead of reading the TIFFs.
+        aoi (tuple, optional): Bounding box (left, bottom, right, top) in the TIFFs' CRS; only this
+            area is read.
+
+    Raises:
+        ValueError: If ``stacked_array`` does not cover 12 months for every year from start_year to end_year.
 
     Returns:
-        dict: Dictionary of 3D NumPy arrays (one per month) with shape (rows, cols, years).
+        dict: Dictionary of float 3D NumPy array views (float32 unless the TIFFs need float64, one per month)
+        with shape (years, rows, cols).
     """
-    # Get the shape of a single TIFF array
-    array_shape = get_shape_of_first_tiff(tiff_files, tiff_directory)
-    
-    # Calculate the total number of years
-    total_years = end_year - start_year + 1
-    
-    # Initialize 3D arrays for each month (filled with NaNs)
-    monthly_arrays = {month: np.full((*array_shape, total_years), np.nan) for month in range(1, 13)}
-    
-    # Create a quick-lookup set for missing files
-    missing_files_set = set(missing_files)
-    
-    for year in range(start_year, end_year + 1):
-        for month in range(1, 13):
-            filename = f"clipped_final_img_{year}_{month:02d}.tif"
-            file_path = os.path.join(tiff_directory, filename)
-            year_index = year - start_year  # Year index in the 3D array
-            
-            # Handle missing files
-            if filename in missing_files_set:
-                print(f"Skipping missing file: {filename}")
-                continue
-            
-            if filename in tiff_files and os.path.exists(file_path):
-                try:
-                    array = read_tiff_to_array(file_path)
-                    monthly_arrays[month][..., year_index] = array  # Assign to correct position
-                except rasterio.errors.RasterioIOError as e:
-                    print(f"Error reading file {file_path}: {e}")
-            else:
-                print(f"File not found: {file_path}")
-    
-    return monthly_arrays
+    total_months = 12 * (end_year - start_year + 1)
+
+    if stacked_array is None:
+        # Leave the known missing months out of the stack (reported as missing by the stacker)
+        missing_files_set = set(missing_files)
+        available_paths = {
+            filename: file_path for filename, file_path in tiff_paths.items() if filename not in missing_files_set
+        }
+
+        expected_files = generate_expected_filenames(start_year, end_year)
+        stacked_array = stack_tiff_files_with_nans(expected_files, available_paths, probe_first_tiff(available_paths), aoi=aoi)
+    elif stacked_array.shape[0] != total_months:
+        raise ValueError(
+            f"Stacked array has {stacked_array.shape[0]} time steps, expected {total_months} "
+            f"for {start_year}-{end_year}."
+        )
+
+    # Split the time axis into (years, months) and take each month as a view
+    monthly_stack = reshape_stack_by_month(stacked_array)
+    return {month: monthly_stack[:, month - 1] for month in range(1, 13)}
 
 if __name__ == "__main__":
     # Example usage with dummy inputs
     tiff_directory = DUMMY_DIRECTORY  # Replace with your actual directory
-    tiff_files = sorted([file for file in os.listdir(tiff_directory) if file.endswith(".tif")])
+    tiff_paths = scan_tiff_directory(tiff_directory)
 
     # Specify start and end years
     start_year = 2003
@@ -104,11 +69,10 @@ if __name__ == "__main__":
 
     # Create 3D arrays for each month
     monthly_3d_arrays = create_monthly_3d_arrays(
-        tiff_files=tiff_files,
+        tiff_paths=tiff_paths,
         missing_files=DUMMY_MISSING_FILES,
         start_year=start_year,
         end_year=end_year,
-        tiff_directory=tiff_directory,
     )
 
     # Print shapes of generated 3D arrays
@@ -1,41 +1,277 @@
 import numpy as np
-from scipy.interpolate import interp1d
+from numba import njit, prange
+from scipy.interpolate import Akima1DInterpolator, PchipInterpolator
 
-def interpolate_missing_data_3d_spline(data_3d, missing_index):
+# Shape-preserving interpolators, which avoid overshoot between sparse samples
+SHAPE_PRESERVING_INTERPOLATORS = {
+    'pchip': PchipInterpolator,
+    'akima': Akima1DInterpolator,
+}
+
+def _factor_not_a_knot(t_valid, missing_indices, dtype):
+    """
+    Precompute the parts of the not-a-knot cubic spline that depend only on the time grid.
+
+    The tridiagonal system for the second derivatives and the evaluation
+    weights at the missing indices are the same for every pixel, so the
+    Thomas factorization and the interval lookup are done once here and
+    only the data-dependent sweeps are left to _spline_fill.
+
+    Parameters:
+        t_valid (numpy.ndarray): Sorted indices of the valid time steps (at least 4).
+        missing_indices (numpy.ndarray): Indices along the time axis to interpolate.
+        dtype (numpy.dtype): Dtype of the pixel data the factors are applied to.
+
+    Returns:
+        tuple: (six_inv_h, upper, inv_diag, multipliers, end_weights, intervals, weights) for _spline_fill.
+    """
+    t = t_valid.astype(np.float64)
+    h = np.diff(t)
+    n = len(t)
+    m = n - 2
+
+    # Tridiagonal system for the interior second derivatives M[1..n-2]
+    lower = h[:-1].copy()
+    diag = 2.0 * (h[:-1] + h[1:])
+    upper = h[1:].copy()
+
+    # Not-a-knot end conditions eliminate M[0] and M[n-1] from the first and last rows
+    h0, h1 = h[0], h[1]
+    diag[0] = (h0 + h1) * (h0 + 2.0 * h1) / h1
+    upper[0] = (h1 - h0) * (h1 + h0) / h1
+    ha, hb = h[n - 3], h[n - 2]
+    lower[m - 1] = (ha - hb) * (ha + hb) / ha
+    diag[m - 1] = (ha + hb) * (2.0 * ha + hb) / ha
+    end_weights = np.array([(h0 + h1) / h1, -h0 / h1, (ha + hb) / ha, -hb / ha])
+
+    # Thomas algorithm forward elimination of the matrix
+    multipliers = np.zeros(m)
+    for j in range(1, m):
+        multipliers[j] = lower[j] / diag[j - 1]
+        diag[j] -= multipliers[j] * upper[j - 1]
+
+    # Enclosing interval of each missing index (end intervals extrapolate) and the
+    # weights of y[k], y[k+1], M[k], M[k+1] in the cubic evaluated there
+    intervals = np.clip(np.searchsorted(t, missing_indices) - 1, 0, n - 2)
+    h_k = h[intervals]
+    left = t[intervals + 1] - missing_indices
+    right = missing_indices - t[intervals]
+    weights = np.stack([
+        left / h_k,
+        right / h_k,
+        left ** 3 / (6.0 * h_k) - left * h_k / 6.0,
+        right ** 3 / (6.0 * h_k) - right * h_k / 6.0,
+    ], axis=1)
+
+    return (
+        (6.0 / h).astype(dtype),
+        upper.astype(dtype),
+        (1.0 / diag).astype(dtype),
+        multipliers.astype(dtype),
+        end_weights.astype(dtype),
+        intervals,
+        weights.astype(dtype),
+    )
+
+@njit(fastmath=True, cache=True)
+def _spline_fill_pixel(series, t_valid, factors, out):
     """
-    Interpolate missing data in a 3D array using cubic spline interpolation for a specified missing index.
+    Fill the missing time steps of one pixel with a not-a-knot cubic spline.
+
+    Applies the time-grid factorization from _factor_not_a_knot: one forward
+    and one backward sweep give the spline's second derivatives, and the
+    precomputed weights evaluate the cubic at the missing indices. All
+    arithmetic uses the dtype of ``series`` so float32 stacks are solved in
+    float32.
+
+    Parameters:
+        series (numpy.ndarray): 1D time series without NaNs in the valid time steps.
+        t_valid (numpy.ndarray): Sorted indices of the valid time steps (at least 4).
+        factors (tuple): Time-grid factorization from _factor_not_a_knot.
+        out (numpy.ndarray): 1D array receiving the interpolated value at each missing index.
+    """
+    six_inv_h, upper, inv_diag, multipliers, end_weights, intervals, weights = factors
+    n = t_valid.shape[0]
+    m = n - 2
+
+    # Forward sweep over the right-hand side
+    rhs = np.empty(m, dtype=series.dtype)
+    prev_slope = (series[t_valid[1]] - series[t_valid[0]]) * six_inv_h[0]
+    for j in range(m):
+        slope = (series[t_valid[j + 2]] - series[t_valid[j + 1]]) * six_inv_h[j + 1]
+        rhs[j] = slope - prev_slope
+        if j > 0:
+            rhs[j] -= multipliers[j] * rhs[j - 1]
+        prev_slope = slope
+
+    # Back substitution, then the not-a-knot end values
+    M = np.empty(n, dtype=series.dtype)
+    M[m] = rhs[m - 1] * inv_diag[m - 1]
+    for j in range(m - 2, -1, -1):
+        M[j + 1] = (rhs[j] - upper[j] * M[j + 2]) * inv_diag[j]
+    M[0] = end_weights[0] * M[1] + end_weights[1] * M[2]
+    M[n - 1] = end_weights[2] * M[n - 2] + end_weights[3] * M[n - 3]
+
+    for q in range(intervals.shape[0]):
+        k = intervals[q]
+        out[q] = (
+            weights[q, 0] * series[t_valid[k]]
+            + weights[q, 1] * series[t_valid[k + 1]]
+            + weights[q, 2] * M[k]
+            + weights[q, 3] * M[k + 1]
+        )
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _spline_fill(data, t_valid, factors, out):
+    """
+    Fill missing time steps of every pixel with a not-a-knot cubic spline, in parallel.
+
+    Parameters:
+        data (numpy.ndarray): 2D pixel-major array with shape (pixels, time) without NaNs in the valid time steps.
+        t_valid (numpy.ndarray): Sorted indices of the valid time steps (at least 4).
+        factors (tuple): Time-grid factorization from _factor_not_a_knot.
+        out (numpy.ndarray): 2D array with shape (pixels, number of missing indices) receiving the interpolated values.
+    """
+    for p in prange(data.shape[0]):
+        _spline_fill_pixel(data[p], t_valid, factors, out[p])
+
+@njit(fastmath=True, cache=True)
+def _spline_fill_serial(data, t_valid, factors, out):
+    """
+    Fill missing time steps of every pixel with a not-a-knot cubic spline on the calling thread.
+
+    Used for dask blocks, which are already solved in parallel across
+    worker threads; launching Numba's threading layer from those threads
+    can keep the interpreter from exiting.
+
+    Parameters:
+        data (numpy.ndarray): 2D pixel-major array with shape (pixels, time) without NaNs in the valid time steps.
+        t_valid (numpy.ndarray): Sorted indices of the valid time steps (at least 4).
+        factors (tuple): Time-grid factorization from _factor_not_a_knot.
+        out (numpy.ndarray): 2D array with shape (pixels, number of missing indices) receiving the interpolated values.
+    """
+    for p in range(data.shape[0]):
+        _spline_fill_pixel(data[p], t_valid, factors, out[p])
+
+def interpolate_missing_data_3d_spline(data_3d, missing_indices, inplace=False, method='cubic', parallel=True):
+    """
+    Interpolate missing data in a 3D array using cubic spline interpolation for the specified missing indices.
+
+    With ``method='cubic'`` the cube is transposed once to a pixel-major
+    (x * y, time) layout and every pixel's not-a-knot cubic spline is fitted
+    in a parallel Numba kernel, then evaluated at every missing index. With
+    ``'pchip'`` or ``'akima'`` a shape-preserving SciPy interpolator is fitted
+    to all pixels at once, which avoids overshoot where the monthly series
+    is sparse. Pixels with NaNs in any of the valid time steps are left as
+    NaN at the missing indices, and pixels that are constant over the valid
+    time steps are filled with that constant without a spline fit. Only the
+    missing slices are allocated; the input cube is never copied. Float
+    cubes are solved in their own dtype; integer cubes are solved in
+    floating point (np.result_type(dtype, np.float32)).
 
     Parameters:
         data_3d (numpy.ndarray): 3D array with shape (time, x, y) representing time series data.
-        missing_index (int): Index along the time axis where data is missing.
+        missing_indices (int or list): Index or indices along the time axis where data is missing.
+        inplace (bool): Whether to write the interpolated slices directly into ``data_3d``.
+        method (str): Interpolation method: 'cubic', 'pchip' or 'akima'.
+        parallel (bool): Whether the 'cubic' kernel solves pixels on all cores; pass False when
+            calling from worker threads that are already parallel.
+
+    Returns:
+        numpy.ndarray or tuple: ``data_3d`` with the missing indices filled if ``inplace`` is True,
+        otherwise a tuple (missing_indices, filled_slices) where filled_slices has shape
+        (len(missing_indices), x, y).
+
+    Raises:
+        TypeError: If ``inplace`` is True and ``data_3d`` is not a float array.
+    """
+    if method != 'cubic' and method not in SHAPE_PRESERVING_INTERPOLATORS:
+        raise ValueError(f"Unknown interpolation method: {method}")
+
+    if inplace and not np.issubdtype(data_3d.dtype, np.floating):
+        raise TypeError(f"In-place interpolation requires a float array, got {data_3d.dtype}")
+    dtype = np.result_type(data_3d.dtype, np.float32)
+
+    time_steps = data_3d.shape[0]
+    missing_indices = np.atleast_1d(missing_indices)
+
+    # Flatten the spatial dimensions so every column is one pixel's time series
+    data_2d = data_3d.reshape(time_steps, -1)
+
+    # Find valid time points (excluding all missing indices)
+    valid_mask = np.ones(time_steps, dtype=bool)
+    valid_mask[missing_indices] = False
+    valid_time_points = np.flatnonzero(valid_mask)
+
+    # Check if there are enough valid data points to perform the interpolation
+    min_points = 4 if method == 'cubic' else 2
+    if len(valid_time_points) < min_points:
+        raise ValueError(f"At least {min_points} valid time steps are required for {method} interpolation.")
+
+    # Pixels with NaNs (e.g. ocean or masked areas) stay NaN, and constant
+    # pixels are filled with their constant; only the rest need a spline fit
+    valid_series = data_2d[valid_mask].astype(dtype, copy=False)
+    col_valid = np.isfinite(valid_series).all(axis=0)
+    col_const = col_valid & (np.ptp(valid_series, axis=0) == 0)
+    col_fit = col_valid & ~col_const
+
+    filled = np.full((len(missing_indices), data_2d.shape[1]), np.nan, dtype=dtype)
+    filled[:, col_const] = valid_series[0, col_const]
+    if col_fit.any() and method == 'cubic':
+        # Pixel-major copy so each thread reads one contiguous time series
+        pixel_series = np.ascontiguousarray(data_2d.T[col_fit], dtype=dtype)
+        pixel_filled = np.empty((pixel_series.shape[0], len(missing_indices)), dtype=dtype)
+        factors = _factor_not_a_knot(valid_time_points, missing_indices, dtype)
+        kernel = _spline_fill if parallel else _spline_fill_serial
+        kernel(pixel_series, valid_time_points, factors, pixel_filled)
+        filled[:, col_fit] = pixel_filled.T
+    elif col_fit.any():
+        # One batched shape-preserving fit over all valid pixels
+        interpolator = SHAPE_PRESERVING_INTERPOLATORS[method](
+            valid_time_points, valid_series[:, col_fit], axis=0
+        )
+        filled[:, col_fit] = interpolator(missing_indices, extrapolate=True)
+    filled_slices = filled.reshape(len(missing_indices), *data_3d.shape[1:])
+
+    if inplace:
+        data_3d[missing_indices] = filled_slices
+        return data_3d
+
+    return missing_indices, filled_slices
+
+def _spline_fill_block(block, missing_indices, method):
+    """
+    Interpolate the missing indices of one (time, x, y) block of a dask array.
+
+    Parameters:
+        block (numpy.ndarray): Block holding complete time series for a spatial tile.
+        missing_indices (numpy.ndarray): Indices along the time axis to interpolate.
+        method (str): Interpolation method passed to interpolate_missing_data_3d_spline.
 
     Returns:
-        numpy.ndarray: 3D array with missing data interpolated for the specified index.
-    """
-    time_steps, x_dim, y_dim = data_3d.shape
-    
-    # Create a copy of the original data to store interpolated values
-    interpolated_data = np.copy(data_3d)
-    
-    # Iterate over all spatial locations (x, y)
-    for x in range(x_dim):
-        for y in range(y_dim):
-            # Extract the time series for the current (x, y) location
-            time_series = data_3d[:, x, y]
-            
-            # Find valid indices (excluding the missing index)
-            valid_indices = [i for i in range(time_steps) if i != missing_index]
-            valid_time_points = np.array(valid_indices)
-            valid_data_points = time_series[valid_time_points]
-            
-            # Check if there are enough valid data points to perform interpolation
-            if len(valid_data_points) >= 2:
-                # Create the cubic spline interpolator function
-                interpolator = interp1d(valid_time_points, valid_data_points, kind='cubic', fill_value="extrapolate")
-                
-                # Interpolate missing data point
-                interpolated_data[missing_index, x, y] = interpolator(missing_index)
-            else:
-                print(f"Not enough valid data to interpolate at position ({x}, {y}). Skipping...")
-    
-    return interpolated_data
+        numpy.ndarray: Copy of the block with the missing indices filled.
+    """
+    return interpolate_missing_data_3d_spline(
+        np.array(block), missing_indices, inplace=True, method=method, parallel=False
+    )
+
+def interpolate_missing_data_3d_spline_dask(data_3d, missing_indices, method='cubic'):
+    """
+    Lazily interpolate missing data in a dask array, one spatial tile at a time.
+
+    The time axis is merged into a single chunk so each block holds whole
+    pixel time series; blocks are then filled independently, each on one
+    dask worker thread, so the full cube never has to fit in memory.
+    Requires dask.
+
+    Parameters:
+        data_3d (dask.array.Array): 3D float array with shape (time, x, y), e.g. from stack_tiff_files_lazy.
+        missing_indices (int or list): Index or indices along the time axis where data is missing.
+        method (str): Interpolation method: 'cubic', 'pchip' or 'akima'.
+
+    Returns:
+        dask.array.Array: Lazy 3D array with missing data interpolated for the specified indices.
+    """
+    missing_indices = np.atleast_1d(missing_indices)
+    data_3d = data_3d.rechunk({0: -1})
+    return data_3d.map_blocks(_spline_fill_block, missing_indices, method, dtype=data_3d.dtype)